@@ -17,12 +17,12 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from piperum.background import TaskPoller
+from piperum.background import get_default_poller
 from piperum.runner import Piperum
 
 
 __all__ = ["piperum"]
 
 
-tasks_poller = TaskPoller()
+tasks_poller = get_default_poller()
 piperum = Piperum(tasks_poller)
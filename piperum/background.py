@@ -18,13 +18,19 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import os
-import time
+import select
 from signal import SIGKILL, SIGTERM
 from subprocess import Popen, TimeoutExpired
-from threading import Thread
+from threading import Lock, Thread
 from typing import Self
 
 
+POLL_INTERVAL = 0.1
+
+_default_poller: "TaskPoller | None" = None
+_default_poller_lock: Lock = Lock()
+
+
 class Task:
     """
     Representer of pipeline running in background.
@@ -32,6 +38,8 @@ class Task:
     :param prcs: list of pipeline Popen objects
     """
 
+    __slots__ = ("_prcs", "pid")
+
     def __init__(self, prcs: list[Popen]) -> Self:
         self._prcs: list[Popen] = prcs
         self.pid: int = prcs[0].pid
@@ -90,35 +98,115 @@ class Task:
 
 
 class TaskPoller:
+    """
+    Poller of background tasks completion.
+
+    Each task is watched by pidfd of its last process, so the polling thread sleeps until some task completes.
+    Falls back to periodic polling on kernels without pidfd support (< 5.3).
+    """
+
+    __slots__ = ("tasks", "_poll_th", "_lock", "_ep", "_map", "_unwatched", "_wakeup_fd")
+
     def __init__(self) -> Self:
         self.tasks: set = set()
         self._poll_th: Thread | None = None
+        self._lock: Lock = Lock()
+        self._ep: select.epoll = select.epoll()
+        self._map: dict[int, Task] = {}
+        self._unwatched: set = set()
+        self._wakeup_fd: int = os.eventfd(0, os.EFD_CLOEXEC | os.EFD_NONBLOCK)
+        self._ep.register(self._wakeup_fd, select.EPOLLIN)
+
+    def _watch(self, task: Task) -> bool:
+        """
+        Register task pidfd within epoll.
+
+        :param task: background task
+        :returns:    False if task is already complete, otherwise - True
+        """
+
+        try:
+            pidfd: int = os.pidfd_open(task._prcs[-1].pid)
+        except ProcessLookupError:
+            return False
+        except (AttributeError, OSError):
+            self._unwatched.add(task)
+            # polling thread may be blocked in epoll without timeout; wake it up to switch to periodic polling
+            os.eventfd_write(self._wakeup_fd, 1)
+        else:
+            self._map[pidfd] = task
+            self._ep.register(pidfd, select.EPOLLIN)
+
+        return True
 
     def _poll_func(self) -> None:
         while True:
+            with self._lock:
+                if not self.tasks:
+                    self._poll_th = None
+                    break
+                timeout: float = POLL_INTERVAL if self._unwatched else -1
+
             finished_tasks: set = set()
-            time.sleep(0.1)
-            if not self.tasks:
-                break
-            for task in self.tasks:
-                rc: int | None = task.returncode
-                if rc is not None:
+            for pidfd, _ in self._ep.poll(timeout):
+                if pidfd == self._wakeup_fd:
+                    os.eventfd_read(self._wakeup_fd)
+                    continue
+
+                # fd number must not be reused by add() until it is dropped from epoll and map
+                with self._lock:
+                    self._ep.unregister(pidfd)
+                    task: Task = self._map.pop(pidfd)
+                os.close(pidfd)
+
+                task._prcs[-1].poll()
+                finished_tasks.add(task)
+
+            for task in tuple(self._unwatched):
+                if task.returncode is not None:
                     finished_tasks.add(task)
 
-            self.tasks.difference_update(finished_tasks)
+            with self._lock:
+                self.tasks.difference_update(finished_tasks)
+                self._unwatched.difference_update(finished_tasks)
 
     def add(self, task: Task) -> Task:
         """
         Add task for polling.
         """
 
-        self.tasks.add(task)
-        if self._poll_th is None or not self._poll_th.is_alive():
-            self._poll_th = Thread(target=self._poll_func)
-            self._poll_th.start()
+        with self._lock:
+            if not self._watch(task):
+                return task
+
+            self.tasks.add(task)
+            if self._poll_th is None:
+                self._poll_th = Thread(target=self._poll_func)
+                self._poll_th.start()
 
         return task
 
     def __del__(self) -> None:
         for task in self.tasks:
             task.kill(signal=SIGKILL)
+
+        for pidfd in self._map:
+            os.close(pidfd)
+        os.close(self._wakeup_fd)
+        self._ep.close()
+
+
+def get_default_poller() -> TaskPoller:
+    """
+    Get task poller shared by all Piperum instances created without their own one.
+
+    Poller is created lazily on first call.
+    """
+
+    global _default_poller
+
+    with _default_poller_lock:
+        if _default_poller is None:
+            _default_poller = TaskPoller()
+
+    return _default_poller
@@ -17,27 +17,40 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import copy
 import os
 import signal
 from subprocess import CalledProcessError, PIPE, Popen
 from typing import LiteralString, Self
 
 from piperum import utils
-from piperum.background import Task, TaskPoller
+from piperum.background import get_default_poller, Task, TaskPoller
 
 
 class Piperum:
     """
     Handy subprocess pipelines runner with pipelines support.
 
-    :param task_poller: background.TaskPoller; polls background tasks completion
+    :param task_poller: background.TaskPoller; polls background tasks completion; shared default one if None
     """
 
-    def __init__(self, task_poller: TaskPoller) -> Self:
+    def __init__(self, task_poller: TaskPoller | None = None) -> Self:
         self._env: dict[LiteralString, LiteralString] = {}
+        self._prcs_env: dict[str, str] | None = self._build_env()
         self._cwd: str | os.PathLike | None = None
-        self._task_poller: TaskPoller = task_poller
+        self._task_poller: TaskPoller = task_poller if task_poller is not None else get_default_poller()
+        self._tty: utils.ControlTty = utils.ControlTty()
+
+    def _build_env(self) -> dict[str, str] | None:
+        """
+        Build pipelines environment: current process environment updated by extra variables.
+
+        :returns: None if there are no extra variables, so pipelines inherit current process environment as is
+        """
+
+        if not self._env:
+            return None
+
+        return {**os.environ, **self._env}
 
     def __call__(
         self,
@@ -54,12 +67,14 @@ class Piperum:
         if not all(map(lambda x: type(x) is str, env.values())):
             raise TypeError("env variable value should be of type str.")
 
-        new_piperum = copy.copy(self)
+        new_piperum: Self = type(self).__new__(type(self))
 
         new_piperum._cwd = cwd if cwd is not None else self._cwd
+        new_piperum._task_poller = self._task_poller
+        new_piperum._tty = self._tty
 
-        new_piperum._env = self._env
-        new_piperum._env.update(env)
+        new_piperum._env = {**self._env, **env}
+        new_piperum._prcs_env = new_piperum._build_env() if env else self._prcs_env
 
         return new_piperum
 
@@ -71,7 +86,9 @@ class Piperum:
 
     def _kill(self, prcs: list[Popen]) -> None:
         """
-        Send signal to process group.
+        Kill process group and each pipeline process, reap processes and close their output pipes.
+
+        Input pipe is left to the writer thread, which closes it once input is written.
 
         :param prcs: list of pipeline processes
         """
@@ -80,7 +97,16 @@ class Piperum:
             os.killpg(prcs[0].pid, signal.SIGKILL)
         except ProcessLookupError:
             pass
-        map(lambda prc: prc.wait(), prcs)
+        for prc in prcs:
+            # process may have left pipeline process group (e.g. setsid), so group signal misses it
+            if prc.returncode is None:
+                try:
+                    prc.kill()
+                except ProcessLookupError:
+                    pass
+            prc.wait()
+            if prc.stdout is not None:
+                prc.stdout.close()
 
     def run(
         self,
@@ -105,26 +131,30 @@ class Piperum:
         :raises subprocess.CalledProcessError:  any process of pipeline return code != 0
         """
 
-        prc_inp: str | os.PathLike | None = inptxt or inpfl
         retcode: int = 0
 
         with (
-            utils.wrap_tty() as tty_fd,
+            self._tty.wrap() as tty_fd,
             utils.prepare_std(inptxt=inptxt, inpfl=inpfl, outfl=outfl, errfl=errfl, err2out=err2out) as std,
         ):
             prcs: list[Popen] = utils.construct_pipeline(
-                *cmds, cwd=self._cwd, env=self._env, stdin=std[0], stdout=std[1], stderr=std[2]
+                *cmds, cwd=self._cwd, env=self._prcs_env, stdin=std[0], stdout=std[1], stderr=std[2]
             )
 
-            os.tcsetpgrp(tty_fd, prcs[0].pid)
+            if tty_fd is not None:
+                os.tcsetpgrp(tty_fd, prcs[0].pid)
 
             try:
+                if inptxt is not None:
+                    utils.feed_stream(prcs[0].stdin, inptxt)
+
+                if timeout is None:
+                    failed_prc: Popen | None = utils.reap_pipeline(prcs)
+                    if failed_prc is not None:
+                        raise CalledProcessError(failed_prc.returncode, failed_prc.args)
+
                 for prc in prcs:
-                    if prc_inp is None:
-                        prc.wait(timeout)
-                    else:
-                        prc.communicate(input=prc_inp, timeout=timeout)
-                        prc_inp = None
+                    prc.wait(timeout)
 
                     retcode = prc.returncode
 
@@ -141,7 +171,7 @@ class Piperum:
         errfl: str | os.PathLike | None = None,
         err2out: bool = False,
         timeout: int | None = None,
-    ) -> str | None:
+    ) -> str:
         """
         Run pipeline in foreground and capture stdout.
 
@@ -153,35 +183,31 @@ class Piperum:
         :param timeout:                         pipeline completion wait timeout
         :returns:                               captured text
         :raises subprocess.CalledProcessError:  any process of pipeline return code != 0
+        :raises subprocess.TimeoutExpired:      on pipeline output reading timeout expired
         """
 
-        prc_inp: str | None = inptxt or inpfl
-        res_out: str = None
+        res_out: bytearray = bytearray()
         retcode: int = 0
 
         with (
-            utils.wrap_tty() as tty_fd,
+            self._tty.wrap() as tty_fd,
             utils.prepare_std(inptxt=inptxt, inpfl=inpfl, outfl=None, errfl=errfl, err2out=err2out) as std,
         ):
             prcs: list[Popen] = utils.construct_pipeline(
-                *cmds, cwd=self._cwd, env=self._env, stdin=std[0], stdout=PIPE, stderr=std[2]
+                *cmds, cwd=self._cwd, env=self._prcs_env, stdin=std[0], stdout=PIPE, stderr=std[2]
             )
 
-            os.tcsetpgrp(tty_fd, prcs[0].pid)
+            if tty_fd is not None:
+                os.tcsetpgrp(tty_fd, prcs[0].pid)
 
             try:
-                prcs_len: int = len(prcs)
-                res_out: str | bytes = ""
-                for i, prc in enumerate(prcs):
-                    if prcs_len == 1:
-                        res_out, _ = prc.communicate(input=prc_inp, timeout=timeout)
-                    elif prc_inp is not None:
-                        prc.communicate(input=prc_inp, timeout=timeout)
-                        prc_inp = None
-                    elif i == prcs_len - 1:
-                        res_out, _ = prc.communicate(timeout=timeout)
-                    else:
-                        prc.wait(timeout)
+                if inptxt is not None:
+                    utils.feed_stream(prcs[0].stdin, inptxt)
+
+                res_out = utils.read_stream(prcs[-1], timeout=timeout)
+
+                for prc in prcs:
+                    prc.wait(timeout)
 
                     retcode = prc.returncode
 
@@ -190,7 +216,7 @@ class Piperum:
             finally:
                 self._kill(prcs)
 
-        return res_out
+        return utils.decode_output(res_out)
 
     def run_bg(
         self,
@@ -213,7 +239,7 @@ class Piperum:
 
         with utils.prepare_std(inpfl=inpfl, outfl=outfl, errfl=errfl, err2out=err2out) as std:
             prcs: list[Popen] = utils.construct_pipeline(
-                *cmds, cwd=self._cwd, env=self._env, stdin=std[0], stdout=std[1], stderr=std[2]
+                *cmds, cwd=self._cwd, env=self._prcs_env, stdin=std[0], stdout=std[1], stderr=std[2]
             )
 
         return self._task_poller.add(Task(prcs))
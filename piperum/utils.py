@@ -17,45 +17,85 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import fcntl
 import os
-import re
+import selectors
 import shlex
 import signal
-import sys
-from collections.abc import Generator
+import time
+from collections.abc import Callable, Generator
 from contextlib import contextmanager
-from subprocess import PIPE, Popen, STDOUT
-from typing import IO
+from functools import lru_cache
+from subprocess import PIPE, Popen, STDOUT, TimeoutExpired
+from threading import Lock, Thread
+from typing import IO, Self
 
 
-DO_APPEND_RE = re.compile(r"^\+")
+PIPE_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 20
+IOV_MAX = os.sysconf("SC_IOV_MAX")
+# stdin is checked by fd, as sys.stdin may be None or replaced (daemons, test runners)
+STDIN_FD = 0
+HAS_TTY = os.isatty(STDIN_FD)
+
+
+@lru_cache(maxsize=512)
+def _strip_plus(path: str) -> tuple[bool, str]:
+    """
+    Split append mark off file name.
+
+    :param path: file name, optionally prefixed with "+"
+    :returns:    tuple of append flag and file name
+    """
+
+    path = path.strip()
+    if path.startswith("+"):
+        return True, path[1:].lstrip()
+
+    return False, path
+
+
+@lru_cache(maxsize=512)
+def _split(cmd: str) -> tuple[str, ...]:
+    """
+    Split command into arguments.
+
+    :param cmd: pipeline command
+    :returns:   tuple of command arguments
+    """
+
+    return tuple(shlex.split(cmd))
 
 
 def open_stream_w(path: str | os.PathLike | None) -> IO | None:
     """
     Open/create file for write/append.
 
+    File is only handed over to pipeline process as file descriptor, so it is opened unbuffered in binary mode.
+
     :param path: file name
     """
 
     if path is None:
         return None
     else:
-        mode: str = "a" if DO_APPEND_RE.match(str(path)) is not None else "w"
-        return open(re.sub(r"^\+", "", str(path)).strip(), mode)
+        do_append, fl_name = _strip_plus(str(path))
+        return open(fl_name, "ab" if do_append else "wb", buffering=0)
 
 
 def open_stream_r(path: str | os.PathLike | None) -> IO | None:
     """
     Open file for reading.
 
+    File is only handed over to pipeline process as file descriptor, so it is opened unbuffered in binary mode.
+
     :param path: file name
     """
 
     if path is None:
         return None
     else:
-        return open(re.sub(r"^\+", "", str(path)).strip())
+        return open(_strip_plus(str(path))[1], "rb", buffering=0)
 
 
 @contextmanager
@@ -97,48 +137,138 @@ def prepare_std(
     try:
         yield (stdin, stdout, stderr)
     finally:
-        map(lambda stream: stream.close(), filter(lambda stream: stream is not None, [stdin, stdout, stderr]))
+        for stream in (stdin, stdout, stderr):
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
 
 
-@contextmanager
-def wrap_tty() -> Generator:
+class ControlTty:
+    """
+    Control terminal of current process.
+
+    Terminal is looked up and opened once per process; if stdin is not a control terminal, wrapping is a no-op.
+    SIGTTOU handler swap and original foreground process group are shared by nested/concurrent wraps.
+    """
+
+    _lock: Lock = Lock()
+    _fd: int | None = None
+    _is_open: bool = False
+    _depth: int = 0
+    _orig_tcpgrp: int | None = None
+    _orig_sigttou_handler: Callable | int | None = None
+
+    def __init__(self) -> Self:
+        cls: type[ControlTty] = type(self)
+        with cls._lock:
+            if not cls._is_open:
+                cls._fd = cls._open()
+                cls._is_open = True
+
+    @staticmethod
+    def _open() -> int | None:
+        """
+        Open control terminal.
+
+        :returns: control tty file descriptor, None if stdin is not a control terminal
+        """
+
+        if not HAS_TTY:
+            return None
+
+        try:
+            fd: int = os.open(os.ttyname(STDIN_FD), os.O_RDONLY)
+        except OSError:
+            # e.g. pty of another mount namespace, or no access to the terminal device
+            return None
+
+        try:
+            os.tcgetpgrp(fd)
+        except OSError:
+            # tty, but not a control terminal of the process (e.g. after setsid())
+            os.close(fd)
+            return None
+
+        return fd
+
+    @property
+    def fd(self) -> int | None:
+        """
+        Control tty file descriptor, None if there is no control tty.
+        """
+
+        return type(self)._fd
+
+    @contextmanager
+    def wrap(self) -> Generator:
+        """
+        Deal with process group to control terminal association
+
+        * memorize current process group associated to control terminal
+        * inhibit SIGTTOU handling
+        * roll back things afterwards
+
+        Only the outermost of nested/concurrent wraps gets the terminal to hand over to its pipeline,
+        and the terminal is given back to the original process group once the last wrap exits.
+
+        :yields: control tty file descriptor, None if there is no control tty or it is held by another wrap
+        """
+
+        if self.fd is None:
+            yield None
+            return
+
+        cls: type[ControlTty] = type(self)
+        with cls._lock:
+            is_outermost: bool = cls._depth == 0
+            if is_outermost:
+                cls._orig_tcpgrp = os.tcgetpgrp(self.fd)
+                cls._orig_sigttou_handler = signal.getsignal(signal.SIGTTOU)
+                signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+            cls._depth += 1
+
+        try:
+            yield self.fd if is_outermost else None
+        finally:
+            with cls._lock:
+                cls._depth -= 1
+                if cls._depth == 0:
+                    os.tcsetpgrp(self.fd, cls._orig_tcpgrp)
+                    signal.signal(signal.SIGTTOU, cls._orig_sigttou_handler)
+
+
+def open_pipe() -> tuple[int, int]:
     """
-    Deal with process group to control terminal association
+    Create pipe for connecting pipeline processes.
 
-    * memorize current process group associated to control terminal
-    * inhibit SIGTTOU handling
-    * roll back things afterwards
+    Pipe capacity is enlarged to PIPE_SIZE to cut down read/write syscalls and context switches
+    on bulk data; default capacity is kept if the limit of /proc/sys/fs/pipe-max-size is exceeded.
 
-    :yields: control tty file descriptor
+    :returns: tuple of read and write file descriptors
     """
-    tty_path: str = os.ttyname(sys.stdin.fileno())
-    tty_fd: IO = os.open(tty_path, os.O_RDONLY)
 
-    orig_tcpgrp: int = os.tcgetpgrp(tty_fd)
-    orig_sigttou_handler = signal.getsignal(signal.SIGTTOU)
-    signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+    pipe_r, pipe_w = os.pipe2(os.O_CLOEXEC)
     try:
-        yield tty_fd
-    finally:
-        os.tcsetpgrp(tty_fd, orig_tcpgrp)
-        signal.signal(signal.SIGTTOU, orig_sigttou_handler)
-        os.close(tty_fd)
+        fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    except OSError:
+        pass
+
+    return pipe_r, pipe_w
 
 
 def construct_pipeline(
     *cmds: str,
     cwd: str | None = None,
     env: dict[str, str] | None = None,
-    stdin: PIPE | None = None,
-    stdout: PIPE | None = None,
-    stderr: PIPE | None = None,
+    stdin: IO | int | None = None,
+    stdout: IO | int | None = None,
+    stderr: IO | int | None = None,
 ) -> list[Popen]:
     """
     Spawn processes, connect them by pipes, connect std streams.
 
     :param *cmds:  pipeline commands
     :param cwd:    pipeline working directory
-    :param env:    extra envrionment variables to set for pipeline
+    :param env:    pipeline environment; current process environment is inherited if None
     :param stdin:  input stream
     :param stdout: output stream
     :param stderr: error stream
@@ -146,45 +276,155 @@ def construct_pipeline(
     """
 
     prcs: list[Popen] = []
+    pipes: list[tuple[int, int]] = []
     pipeline_size: int = len(cmds)
     pgid: int = 0
 
-    prcs_env: dict = os.environ.copy()
-    if env is not dict:
-        prcs_env.update(env)
-
-    for i, cmd in enumerate(cmds):
-        cmd_as_list: list[str] = shlex.split(cmd)
-
-        prc_stdin: IO | int | None = None
-        prc_stdout: IO | int | None = None
-        prc_stderr: IO | int | None = stderr
-
-        if i == 0:
-            prc_stdin = stdin
-        if i > 0:
-            prc_stdin = prcs[i - 1].stdout
-
-        if i < pipeline_size - 1:
-            prc_stdout = PIPE
-        if i == pipeline_size - 1:
-            prc_stdout = stdout
-
-        prc = Popen(
-            cmd_as_list,
-            stdin=prc_stdin,
-            stdout=prc_stdout,
-            stderr=prc_stderr,
-            env=env,
-            bufsize=1,
-            encoding="utf-8",
-            text=True,
-            process_group=pgid,
-            cwd=cwd,
-        )
-        if pgid == 0:
-            pgid = prc.pid
-
-        prcs.append(prc)
+    try:
+        for _ in range(pipeline_size - 1):
+            pipes.append(open_pipe())
+
+        for i, cmd in enumerate(cmds):
+            prc_stdin: IO | int | None = stdin if i == 0 else pipes[i - 1][0]
+            prc_stdout: IO | int | None = stdout if i == pipeline_size - 1 else pipes[i][1]
+            prc_stderr: IO | int | None = stderr
+
+            # No preexec_fn/user/group here: keeps Popen on the vfork() path of _posixsubprocess,
+            # so parent memory size does not affect spawn time.
+            # Pipes are opened unbuffered in binary mode: they are only accessed through their file descriptors
+            # (see write_stream/read_stream), and output is decoded once by decode_output.
+            prc = Popen(
+                list(_split(cmd)),
+                stdin=prc_stdin,
+                stdout=prc_stdout,
+                stderr=prc_stderr,
+                env=env,
+                bufsize=0,
+                process_group=pgid,
+                cwd=cwd,
+            )
+            if pgid == 0:
+                pgid = prc.pid
+
+            prcs.append(prc)
+    finally:
+        # pipe ends are owned by child processes from now on
+        for pipe_r, pipe_w in pipes:
+            os.close(pipe_r)
+            os.close(pipe_w)
 
     return prcs
+
+
+def write_stream(stream: IO, data: bytes) -> None:
+    """
+    Write data to process input stream and close it.
+
+    Data is written to stream file descriptor with a single writev of CHUNK_SIZE slices (repeated only on partial
+    write or when data exceeds IOV_MAX slices), bypassing stream buffering and encoding.
+
+    :param stream: process input stream
+    :param data:   data to be written
+    """
+
+    fd: int = stream.fileno()
+    view: memoryview = memoryview(data)
+    try:
+        while view:
+            iov_len: int = min(len(view), CHUNK_SIZE * IOV_MAX)
+            view = view[os.writev(fd, [view[i : i + CHUNK_SIZE] for i in range(0, iov_len, CHUNK_SIZE)]) :]
+    except BrokenPipeError:
+        pass
+    finally:
+        stream.close()
+
+
+def feed_stream(stream: IO, text: str) -> Thread:
+    """
+    Encode text once and write it to process input stream in background.
+
+    :param stream: process input stream
+    :param text:   text to be written
+    :returns:      writer thread
+    """
+
+    writer: Thread = Thread(target=write_stream, args=(stream, text.encode("utf-8")), daemon=True)
+    writer.start()
+
+    return writer
+
+
+def read_stream(prc: Popen, timeout: int | None = None) -> bytearray:
+    """
+    Read process stdout until EOF.
+
+    Data is read from stdout file descriptor by chunks of CHUNK_SIZE, bypassing stream buffering and decoding.
+
+    :param prc:                       process to read stdout of
+    :param timeout:                   reading timeout
+    :returns:                         read data
+    :raises subprocess.TimeoutExpired: on reading timeout expired
+    """
+
+    fd: int = prc.stdout.fileno()
+    buf: bytearray = bytearray()
+    deadline: float | None = None if timeout is None else time.monotonic() + timeout
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(fd, selectors.EVENT_READ)
+        while True:
+            remains: float | None = None if deadline is None else deadline - time.monotonic()
+            if (remains is not None and remains <= 0) or not selector.select(remains):
+                raise TimeoutExpired(prc.args, timeout)
+
+            chunk: bytes = os.read(fd, CHUNK_SIZE)
+            if not chunk:
+                break
+            buf += chunk
+
+    return buf
+
+
+def decode_output(data: bytes | bytearray) -> str:
+    """
+    Decode process output the same way text mode Popen does: utf-8 with universal newlines.
+
+    :param data: process output
+    :returns:    decoded text
+    """
+
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def reap_pipeline(prcs: list[Popen]) -> Popen | None:
+    """
+    Reap pipeline processes in order of their completion; stop on first failed one.
+
+    Processes are reaped by waitid() on pipeline process group, so completion of any process is detected
+    right away, regardless of its position in pipeline. Return codes are stored to Popen objects.
+    Processes left unreaped (no waitid() on platform, or process has left pipeline process group) are to be waited
+    by caller.
+
+    :param prcs: list of pipeline processes
+    :returns:    first failed process, None if there is no failed one
+    """
+
+    if not hasattr(os, "waitid"):
+        return None
+
+    pending: dict[int, Popen] = {prc.pid: prc for prc in prcs if prc.returncode is None}
+    while pending:
+        try:
+            info: os.waitid_result = os.waitid(os.P_PGID, prcs[0].pid, os.WEXITED)
+        except ChildProcessError:
+            break
+
+        prc: Popen | None = pending.pop(info.si_pid, None)
+        if prc is None:
+            continue
+
+        prc.returncode = info.si_status if info.si_code == os.CLD_EXITED else -info.si_status
+        if prc.returncode:
+            return prc
+
+    return None